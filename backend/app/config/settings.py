@@ -7,3 +7,20 @@ SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 DEBUG = os.getenv("DEBUG", "False") == "True"
 ENV = os.getenv("ENV", "development")
+
+# Near-duplicate clustering (see app/services/dedup_service.py)
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.95"))
+DEDUP_LSH_BANDS = int(os.getenv("DEDUP_LSH_BANDS", "16"))
+DEDUP_LSH_ROWS = int(os.getenv("DEDUP_LSH_ROWS", "12"))
+COLLAPSE_DUPLICATES = os.getenv("COLLAPSE_DUPLICATES", "True") == "True"
+# How many extra candidates to fetch so collapsing still fills the result slots
+DEDUP_OVERFETCH = int(os.getenv("DEDUP_OVERFETCH", "4"))
+
+# Out-of-process embedding sidecar (see app/services/embedding_worker.py)
+# 0 workers keeps encoding in the API process
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "0"))
+EMBEDDING_QUEUE_SIZE = int(os.getenv("EMBEDDING_QUEUE_SIZE", "32"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "5.0"))
+# How long startup waits for a worker to load the model (0 = don't wait)
+EMBEDDING_STARTUP_TIMEOUT = float(os.getenv("EMBEDDING_STARTUP_TIMEOUT", "60"))
+EMBEDDING_DIM = 384
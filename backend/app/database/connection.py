@@ -2,11 +2,11 @@ import psycopg2
 from app.config import SUPABASE_DB_URL
 
 
-def get_connection():
-    """Get a new database connection"""
+def get_connection(**kwargs):
+    """Get a new database connection; extra kwargs go to psycopg2.connect"""
     if not SUPABASE_DB_URL:
         raise ValueError("SUPABASE_DB_URL environment variable is not set")
-    return psycopg2.connect(SUPABASE_DB_URL)
+    return psycopg2.connect(SUPABASE_DB_URL, **kwargs)
 
 
 def close_connection(conn):
@@ -1,6 +1,8 @@
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.services.search_service import search_images
+from app.services.dedup_service import cluster_id_sql, detect_cluster_columns
+from app.services.embedding_worker import start_workers, stop_workers
 from app.models import HealthResponse, SearchResponse
 from app.utils import logger
 from app.database import get_connection, close_connection
@@ -23,6 +25,20 @@ app.add_middleware(
 
 app.include_router(chat.router, prefix="/api", tags=["chat"])
 
+
+@app.on_event("startup")
+def startup():
+    """Detect the cluster_id columns and start the embedding sidecar when EMBEDDING_WORKERS is set"""
+    detect_cluster_columns()
+    start_workers()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Stop the embedding sidecar"""
+    stop_workers()
+
+
 @app.get("/health", response_model=HealthResponse)
 def health_check():
     """Health check endpoint"""
@@ -38,11 +54,17 @@ def get_all_images():
         conn = get_connection()
         cur = conn.cursor()
         
-        # Fetch all images from the database
-        cur.execute("""
-            SELECT prompt, image_url, clipscore, 0.0 as similarity
-            FROM images
-            WHERE image_url IS NOT NULL
+        # Fetch one image per near-duplicate cluster (best clipscore wins);
+        # rows without a cluster_id fall back to their own negated id
+        cur.execute(f"""
+            SELECT prompt, image_url, clipscore, similarity
+            FROM (
+                SELECT DISTINCT ON (COALESCE({cluster_id_sql("images")}, -id))
+                       prompt, image_url, clipscore, 0.0 as similarity
+                FROM images
+                WHERE image_url IS NOT NULL
+                ORDER BY COALESCE({cluster_id_sql("images")}, -id), clipscore DESC NULLS LAST, id
+            ) AS representatives
             ORDER BY prompt
         """)
         
@@ -1,7 +1,8 @@
 import requests
 import json
-from app.config.settings import GROQ_API_KEY
+from app.config.settings import GROQ_API_KEY, DEDUP_OVERFETCH
 from app.services.embedding_service import encode_query
+from app.services.dedup_service import cluster_id_sql, collapse_clusters
 from app.database import get_connection, close_connection
 import logging
 
@@ -21,16 +22,20 @@ def get_relevant_context(query_embedding, limit=10):
         
         # Using cosine distance (<=>) for similarity search
         # Get more results initially, then filter by text matching in Python
-        cur.execute("""
+        # Over-fetch so collapsing near-duplicate clusters still leaves `limit` rows
+        cur.execute(f"""
             SELECT ocr_text, caption, image_url, caption, id, 
-                   1 - (embedding <=> %s::vector) as similarity
+                   1 - (embedding <=> %s::vector) as similarity,
+                   {cluster_id_sql("visionimages")} as cluster_id
             FROM visionimages
             ORDER BY embedding <=> %s::vector
             LIMIT %s
-        """, (str(query_embedding), str(query_embedding), limit))
+        """, (str(query_embedding), str(query_embedding), limit * DEDUP_OVERFETCH))
         
         results = cur.fetchall()
-        return results
+        # visionimages has no clipscore, so each cluster keeps its closest member
+        results = collapse_clusters(results, cluster_of=lambda r: r[6])[:limit]
+        return [r[:6] for r in results]
     except Exception as e:
         logger.error(f"Error retrieving context: {e}")
         return []
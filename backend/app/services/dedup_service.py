@@ -0,0 +1,216 @@
+import json
+import logging
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, TypeVar
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from app.config.settings import (
+    DEDUP_SIMILARITY_THRESHOLD,
+    DEDUP_LSH_BANDS,
+    DEDUP_LSH_ROWS,
+    COLLAPSE_DUPLICATES,
+)
+from app.database import get_connection, close_connection
+
+logger = logging.getLogger(__name__)
+
+# Tables that carry a 384-d `embedding` column and can be clustered
+CLUSTERABLE_TABLES = ("images", "visionimages")
+
+# Tables whose cluster_id column is known to exist; filled by detect_cluster_columns()
+_cluster_tables = set()
+
+T = TypeVar("T")
+
+
+def _has_cluster_column(cur, table: str) -> bool:
+    """Lock-free check for the cluster_id column"""
+    cur.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = %s AND column_name = 'cluster_id'
+        """,
+        (table,),
+    )
+    return cur.fetchone() is not None
+
+
+def detect_cluster_columns():
+    """
+    Find which clusterable tables already have a `cluster_id` column.
+
+    Collapsing is only enabled for those tables, so the query paths never
+    select a column that does not exist. The column itself is added by
+    cluster_images.py or the migration in DATABASE.md.
+    """
+    if not COLLAPSE_DUPLICATES:
+        return
+
+    conn = None
+    try:
+        conn = get_connection(connect_timeout=5)
+        cur = conn.cursor()
+        for table in CLUSTERABLE_TABLES:
+            if _has_cluster_column(cur, table):
+                _cluster_tables.add(table)
+            else:
+                logger.warning(f"{table} has no cluster_id column, duplicates will not be collapsed")
+        cur.close()
+    except Exception as e:
+        logger.error(f"Could not check cluster_id columns, duplicates will not be collapsed: {e}")
+    finally:
+        close_connection(conn)
+
+
+def cluster_id_sql(table: str) -> str:
+    """Column expression the query paths select as cluster_id; NULL disables collapsing"""
+    return "cluster_id" if table in _cluster_tables else "NULL::bigint"
+
+
+def _find(parent: np.ndarray, i: int) -> int:
+    """Union-find lookup with path halving"""
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray,
+    threshold: float = DEDUP_SIMILARITY_THRESHOLD,
+    bands: int = DEDUP_LSH_BANDS,
+    rows: int = DEDUP_LSH_ROWS,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Group near-duplicate embeddings using random-hyperplane LSH.
+
+    Every vector gets a `bands * rows` bit signature; vectors sharing all bits
+    of at least one band land in the same bucket. Only pairs inside a bucket
+    are compared, and pairs with cosine similarity >= threshold are merged.
+    Returns, for each input row, the index of its cluster representative
+    (the lowest row index in the cluster).
+    """
+    n = len(embeddings)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+
+    rng = np.random.default_rng(seed)
+    planes = rng.standard_normal((vectors.shape[1], bands * rows)).astype(np.float32)
+    bits = (vectors @ planes) > 0
+    weights = 1 << np.arange(rows, dtype=np.int64)
+
+    parent = np.arange(n, dtype=np.int64)
+    compared = 0
+
+    for band in range(bands):
+        keys = bits[:, band * rows:(band + 1) * rows] @ weights
+        order = np.argsort(keys, kind="stable")
+        boundaries = np.flatnonzero(np.diff(keys[order])) + 1
+
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+            # Blocked similarity: one matrix product per bucket
+            sims = vectors[bucket] @ vectors[bucket].T
+            compared += len(bucket) * (len(bucket) - 1) // 2
+            left, right = np.nonzero(np.triu(sims >= threshold, k=1))
+            for a, b in zip(bucket[left], bucket[right]):
+                root_a, root_b = _find(parent, a), _find(parent, b)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    logger.info(f"LSH clustering compared {compared} pairs out of {n * (n - 1) // 2}")
+    return np.array([_find(parent, i) for i in range(n)], dtype=np.int64)
+
+
+def assign_clusters(table: str = "images", threshold: float = DEDUP_SIMILARITY_THRESHOLD) -> int:
+    """
+    Offline pass: cluster all rows of `table` and store the result in its
+    `cluster_id` column. The cluster id is the smallest row id in the cluster,
+    so a singleton's cluster id is its own id. Returns the number of clusters.
+    """
+    if table not in CLUSTERABLE_TABLES:
+        raise ValueError(f"Unsupported table: {table}")
+
+    conn = None
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+
+        # ADD COLUMN takes an ACCESS EXCLUSIVE lock even when the column exists,
+        # so only run it when needed and commit before the long read/update
+        if not _has_cluster_column(cur, table):
+            cur.execute("SET LOCAL lock_timeout = '5s'")
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS cluster_id BIGINT")
+        conn.commit()
+
+        cur.execute(f"SELECT id, embedding FROM {table} WHERE embedding IS NOT NULL ORDER BY id")
+        rows = cur.fetchall()
+
+        if not rows:
+            conn.commit()
+            return 0
+
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        # pgvector's text form "[0.1,0.2,...]" is valid JSON
+        embeddings = np.array([json.loads(r[1]) for r in rows], dtype=np.float32)
+
+        representatives = cluster_embeddings(embeddings, threshold=threshold)
+        cluster_ids = ids[representatives]
+
+        execute_values(
+            cur,
+            f"""
+            UPDATE {table} AS t SET cluster_id = v.cluster_id
+            FROM (VALUES %s) AS v(id, cluster_id)
+            WHERE t.id = v.id
+            """,
+            list(zip(ids.tolist(), cluster_ids.tolist())),
+            page_size=1000,
+        )
+        conn.commit()
+        cur.close()
+
+        n_clusters = len(np.unique(cluster_ids))
+        logger.info(f"Assigned {n_clusters} clusters to {len(ids)} rows in {table}")
+        return n_clusters
+
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        close_connection(conn)
+
+
+def collapse_clusters(
+    items: Sequence[T],
+    cluster_of: Callable[[T], Optional[Hashable]],
+    score_of: Optional[Callable[[T], float]] = None,
+) -> List[T]:
+    """
+    Keep one item per cluster, at the position where the cluster first appears.
+
+    The kept item is the best-scoring member according to `score_of`, or the
+    first member when no score is given. Items without a cluster id (rows the
+    offline pass has not seen yet) are always kept.
+    """
+    best: Dict[Hashable, int] = {}
+    order: List[Hashable] = []
+
+    for i, item in enumerate(items):
+        cluster = cluster_of(item)
+        key = ("row", i) if cluster is None else cluster
+        if key not in best:
+            best[key] = i
+            order.append(key)
+        elif score_of is not None and score_of(item) > score_of(items[best[key]]):
+            best[key] = i
+
+    return [items[best[key]] for key in order]
@@ -1,34 +1,54 @@
 import logging
+import threading
 from typing import Optional, List
 from functools import lru_cache
 from sentence_transformers import SentenceTransformer
+from app.services.embedding_worker import EmbeddingWorkerUnavailable, get_pool
 
 logger = logging.getLogger(__name__)
 
 # Initialize sentence transformer model (cached in memory)
 _model = None
+_model_lock = threading.Lock()
 
 def get_model():
     """Load and cache the sentence transformer model"""
     global _model
     if _model is None:
-        try:
-            logger.info("Loading sentence-transformers model: paraphrase-MiniLM-L6-v2")
-            _model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-            logger.info("Model loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading sentence transformer model: {e}")
-            raise
+        with _model_lock:
+            if _model is None:
+                try:
+                    logger.info("Loading sentence-transformers model: paraphrase-MiniLM-L6-v2")
+                    _model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
+                    logger.info("Model loaded successfully")
+                except Exception as e:
+                    logger.error(f"Error loading sentence transformer model: {e}")
+                    raise
     return _model
 
-@lru_cache(maxsize=128)
 def encode_query(query: str) -> Optional[List[float]]:
-    """Generate embedding using local sentence-transformers model"""
+    """Generate embedding, preferring the sidecar workers over the local model"""
     try:
-        model = get_model()
-        embedding = model.encode(query).tolist()
-        logger.info(f"Embedding generated successfully for query: {query[:50]}")
-        return embedding
+        return _encode(query)
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
-        return None
\ No newline at end of file
+        return None
+
+@lru_cache(maxsize=128)
+def _encode(query: str) -> List[float]:
+    """Cached encoding; raises on failure so errors are not cached"""
+    pool = get_pool()
+    if pool is not None:
+        try:
+            embedding = pool.encode(query)
+            logger.info(f"Embedding generated by worker for query: {query[:50]}")
+            return embedding
+        except EmbeddingWorkerUnavailable as e:
+            # Only a pool that is down or not ready falls back; a busy or
+            # failing pool raises EmbeddingWorkerError instead
+            logger.warning(f"Embedding worker unavailable, encoding in-process: {e}")
+
+    model = get_model()
+    embedding = model.encode(query).tolist()
+    logger.info(f"Embedding generated successfully for query: {query[:50]}")
+    return embedding
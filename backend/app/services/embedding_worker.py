@@ -0,0 +1,375 @@
+import itertools
+import logging
+import multiprocessing as mp
+import queue
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Set
+
+from app.config.settings import (
+    EMBEDDING_WORKERS,
+    EMBEDDING_QUEUE_SIZE,
+    EMBEDDING_TIMEOUT,
+    EMBEDDING_DIM,
+    EMBEDDING_STARTUP_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+_FLOAT_SIZE = array("f").itemsize
+
+# How often the listener re-reads the worker list and the stop flag
+_POLL_INTERVAL = 0.2
+
+
+class EmbeddingWorkerUnavailable(RuntimeError):
+    """Raised when the sidecar is not running or not ready; callers fall back to in-process encoding"""
+
+
+class EmbeddingWorkerError(RuntimeError):
+    """Raised when a request to a running sidecar fails or times out; callers should not fall back"""
+
+
+def _worker_main(requests, responses, shm_name: str, dim: int, loader: Optional[Callable] = None):
+    """
+    Sidecar process: loads the model, reports (None, None) once it is ready,
+    then reads (request_id, slot, text) from its `requests` pipe and writes
+    each vector into its slot of the shared block.
+    """
+    if loader is None:
+        from app.services.embedding_service import get_model as loader
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    view = shm.buf.cast("f")
+    try:
+        model = loader()
+        responses.send((None, None))
+        while True:
+            try:
+                job = requests.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+            request_id, slot, text = job
+            try:
+                vector = array("f", model.encode(text).tolist())
+                if len(vector) != dim:
+                    raise ValueError(f"Expected {dim}-d embedding, got {len(vector)}")
+                view[slot * dim:(slot + 1) * dim] = vector
+                responses.send((request_id, None))
+            except Exception as e:
+                responses.send((request_id, str(e)))
+    finally:
+        view.release()
+        shm.close()
+
+
+class _Pending:
+    __slots__ = ("slot", "worker", "event", "error", "abandoned")
+
+    def __init__(self, slot: int, worker: int):
+        self.slot = slot
+        self.worker = worker
+        self.event = threading.Event()
+        self.error: Optional[RuntimeError] = None
+        self.abandoned = False
+
+
+class _Worker:
+    __slots__ = ("process", "requests", "responses", "outstanding", "ready", "dead")
+
+    def __init__(self, process, requests, responses):
+        self.process = process
+        self.requests = requests
+        self.responses = responses
+        self.outstanding: Set[int] = set()
+        self.ready = False
+        self.dead = False
+
+    def close(self):
+        self.requests.close()
+        self.responses.close()
+
+
+class EmbeddingWorkerPool:
+    """
+    Pool of sidecar processes that own the sentence-transformers model.
+
+    The number of in-flight requests is bounded by `queue_size` slots in a
+    shared memory block; vectors come back through those slots, so only a
+    request id crosses the pipe on the way back. Each worker has its own
+    pair of pipes, so a worker that dies cannot wedge a lock shared with the
+    others; its requests are failed, their slots reclaimed, and the worker
+    is respawned.
+    """
+
+    def __init__(
+        self,
+        workers: int = EMBEDDING_WORKERS,
+        queue_size: int = EMBEDDING_QUEUE_SIZE,
+        timeout: float = EMBEDDING_TIMEOUT,
+        dim: int = EMBEDDING_DIM,
+        loader: Optional[Callable] = None,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.dim = dim
+        self.loader = loader
+
+        self._ctx = mp.get_context("spawn")
+        self._workers: List[_Worker] = []
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._view = None
+        self._listener: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._stopping = False
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._pending: Dict[int, _Pending] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def _spawn(self) -> _Worker:
+        requests_reader, requests_writer = self._ctx.Pipe(duplex=False)
+        responses_reader, responses_writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(requests_reader, responses_writer, self._shm.name, self.dim, self.loader),
+            daemon=True,
+        )
+        try:
+            process.start()
+        finally:
+            # The child has its own copies; closing ours lets EOF reach each side
+            requests_reader.close()
+            responses_writer.close()
+        return _Worker(process, requests_writer, responses_reader)
+
+    def start(self, ready_timeout: float = 0):
+        """
+        Spawn the sidecar processes and the response listener, then wait up
+        to `ready_timeout` seconds for the first worker to load the model.
+        """
+        self._shm = shared_memory.SharedMemory(create=True, size=self.queue_size * self.dim * _FLOAT_SIZE)
+        self._view = self._shm.buf.cast("f")
+        for slot in range(self.queue_size):
+            self._free_slots.put(slot)
+
+        for _ in range(self.workers):
+            self._workers.append(self._spawn())
+
+        self._listener = threading.Thread(target=self._listen, name="embedding-listener", daemon=True)
+        self._listener.start()
+        logger.info(f"Started {self.workers} embedding worker(s) with queue size {self.queue_size}")
+
+        deadline = time.monotonic() + ready_timeout
+        while not self._ready.wait(min(_POLL_INTERVAL, max(deadline - time.monotonic(), 0))):
+            if not any(w.process.is_alive() for w in self._workers):
+                logger.warning("All embedding workers exited before loading the model")
+                return
+            if time.monotonic() >= deadline:
+                if ready_timeout > 0:
+                    logger.warning(f"No embedding worker ready after {ready_timeout}s, encoding in-process until one is")
+                return
+
+    def _fail(self, request_id: int, error: RuntimeError):
+        """Hand `error` to a waiting caller, or reclaim the slot if it gave up; call with the lock held"""
+        pending = self._pending.pop(request_id, None)
+        if pending is None:
+            return
+        self._workers[pending.worker].outstanding.discard(request_id)
+        if pending.abandoned:
+            self._free_slots.put(pending.slot)
+            return
+        pending.error = error
+        pending.event.set()
+
+    def _reap(self):
+        """Fail the requests of dead workers and respawn those that had loaded the model"""
+        with self._lock:
+            if self._stopping:
+                return
+            for index, worker in enumerate(self._workers):
+                if worker.dead or worker.process.is_alive():
+                    continue
+                for request_id in list(worker.outstanding):
+                    self._fail(request_id, EmbeddingWorkerError("Embedding worker died"))
+                worker.dead = True
+                worker.close()
+                if not worker.ready:
+                    # Died while loading; respawning would just crash again
+                    logger.error(f"Embedding worker {index} exited with code {worker.process.exitcode} while loading the model")
+                    continue
+                logger.warning(f"Embedding worker {index} exited with code {worker.process.exitcode}, respawning")
+                self._workers[index] = self._spawn()
+
+    def _handle(self, index: int, request_id: Optional[int], error: Optional[str]):
+        """Apply one worker message; call with the lock held"""
+        if request_id is None:
+            self._workers[index].ready = True
+            self._ready.set()
+            return
+        pending = self._pending.pop(request_id, None)
+        if pending is None:
+            return
+        self._workers[pending.worker].outstanding.discard(request_id)
+        if pending.abandoned:
+            # The caller timed out; the slot is only safe to reuse now
+            self._free_slots.put(pending.slot)
+            return
+        if error is not None:
+            pending.error = EmbeddingWorkerError(error)
+        pending.event.set()
+
+    def _listen(self):
+        """Match worker responses to waiting requests and watch for dead workers"""
+        while not self._stopping:
+            with self._lock:
+                live = [(i, w) for i, w in enumerate(self._workers) if not w.dead]
+                connections = {w.responses: i for i, w in live}
+                sentinels = [w.process.sentinel for _, w in live]
+            ready = wait(list(connections) + sentinels, timeout=_POLL_INTERVAL)
+            with self._lock:
+                # Drain responses before reaping, so replies sent just before
+                # a worker exited still reach their callers
+                for connection in ready:
+                    index = connections.get(connection)
+                    if index is None or self._workers[index].responses is not connection:
+                        continue
+                    try:
+                        while connection.poll():
+                            self._handle(index, *connection.recv())
+                    except (EOFError, OSError):
+                        pass
+            self._reap()
+
+    def _live_workers(self) -> List[int]:
+        return [i for i, w in enumerate(self._workers) if w.ready and not w.dead and w.process.is_alive()]
+
+    def is_alive(self) -> bool:
+        """True once a worker has loaded the model and at least one ready worker is running"""
+        return self._listener is not None and not self._stopping and bool(self._live_workers())
+
+    def encode(self, text: str) -> List[float]:
+        """
+        Encode `text` in a sidecar process.
+
+        Waits for a free slot when the queue is full. Raises
+        EmbeddingWorkerUnavailable when no worker can take the request, and
+        EmbeddingWorkerError when the request fails or misses the deadline.
+        """
+        if not self.is_alive():
+            raise EmbeddingWorkerUnavailable("Embedding workers are not running or not ready")
+
+        deadline = time.monotonic() + self.timeout
+        try:
+            slot = self._free_slots.get(timeout=self.timeout)
+        except queue.Empty:
+            raise EmbeddingWorkerError(f"Embedding queue stayed full for {self.timeout}s")
+
+        request_id = next(self._ids)
+        with self._lock:
+            live = self._live_workers()
+            if self._stopping or not live:
+                self._free_slots.put(slot)
+                raise EmbeddingWorkerUnavailable("Embedding workers are not running or not ready")
+            index = min(live, key=lambda i: len(self._workers[i].outstanding))
+            try:
+                self._workers[index].requests.send((request_id, slot, text))
+            except OSError:
+                # The worker exited after the liveness check; the listener respawns it
+                self._free_slots.put(slot)
+                raise EmbeddingWorkerError("Embedding worker died")
+            pending = _Pending(slot, index)
+            self._pending[request_id] = pending
+            self._workers[index].outstanding.add(request_id)
+
+        if not pending.event.wait(max(deadline - time.monotonic(), 0)):
+            with self._lock:
+                if request_id in self._pending:
+                    pending.abandoned = True
+                    raise EmbeddingWorkerError(f"Embedding timed out after {self.timeout}s")
+            # The response arrived between the wait and the lock; the listener
+            # set error and the event while holding the lock, so both are final
+
+        try:
+            if pending.error is not None:
+                raise pending.error
+            with self._lock:
+                if self._view is None:
+                    raise EmbeddingWorkerUnavailable("Embedding workers stopped")
+                return self._view[slot * self.dim:(slot + 1) * self.dim].tolist()
+        finally:
+            self._free_slots.put(slot)
+
+    def stop(self):
+        """Stop the sidecar processes and release the shared memory block; safe after a partial start"""
+        with self._lock:
+            self._stopping = True
+            for request_id in list(self._pending):
+                self._fail(request_id, EmbeddingWorkerUnavailable("Embedding workers stopped"))
+
+        if self._listener is not None:
+            self._listener.join(self.timeout)
+            self._listener = None
+
+        for worker in self._workers:
+            if worker.dead:
+                continue
+            try:
+                worker.requests.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.process.join(self.timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join(self.timeout)
+            if not worker.dead:
+                worker.close()
+        self._workers = []
+        self._ready.clear()
+
+        with self._lock:
+            if self._view is not None:
+                self._view.release()
+                self._view = None
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+        logger.info("Embedding workers stopped")
+
+
+_pool: Optional[EmbeddingWorkerPool] = None
+
+
+def start_workers():
+    """Start the embedding sidecar if EMBEDDING_WORKERS > 0"""
+    global _pool
+    if EMBEDDING_WORKERS <= 0 or _pool is not None:
+        return
+    pool = EmbeddingWorkerPool()
+    try:
+        pool.start(ready_timeout=EMBEDDING_STARTUP_TIMEOUT)
+        _pool = pool
+    except Exception as e:
+        logger.error(f"Could not start embedding workers, using in-process encoding: {e}")
+        pool.stop()
+
+
+def stop_workers():
+    """Stop the embedding sidecar if it is running"""
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+def get_pool() -> Optional[EmbeddingWorkerPool]:
+    """Return the running sidecar pool, or None when encoding in-process"""
+    return _pool
@@ -1,5 +1,7 @@
 from app.database import get_connection, close_connection
 from app.services.embedding_service import encode_query
+from app.services.dedup_service import cluster_id_sql, collapse_clusters
+from app.config.settings import DEDUP_OVERFETCH
 from app.models import ImageResult, SearchResponse
 from typing import List
 
@@ -57,6 +59,9 @@ def search_images(query: str, limit: int = 10) -> SearchResponse:
         # Combine all AND conditions
         where_clause = " AND ".join(and_conditions)
         
+        # Fetch extra candidates so collapsing near-duplicates still fills `limit`
+        candidate_limit = limit * DEDUP_OVERFETCH
+
         # Execute query with priority ordering
         # Priority: exact phrase match first, then by number of matching terms
         cur.execute(
@@ -65,7 +70,8 @@ def search_images(query: str, limit: int = 10) -> SearchResponse:
                    CASE 
                        WHEN prompt ILIKE %s THEN 1.0
                        ELSE 0.9
-                   END AS similarity
+                   END AS similarity,
+                   {cluster_id_sql("images")} AS cluster_id
             FROM images
             WHERE image_url IS NOT NULL AND ({where_clause})
             ORDER BY 
@@ -73,7 +79,7 @@ def search_images(query: str, limit: int = 10) -> SearchResponse:
                 prompt
             LIMIT %s;
             """,
-            [exact_phrase] + params + [exact_phrase, limit],
+            [exact_phrase] + params + [exact_phrase, candidate_limit],
         )
         
         results = cur.fetchall()
@@ -83,14 +89,15 @@ def search_images(query: str, limit: int = 10) -> SearchResponse:
         if not results:
             cur = conn.cursor()
             cur.execute(
-                """
-                SELECT prompt, image_url, clipscore, 1.0 AS similarity
+                f"""
+                SELECT prompt, image_url, clipscore, 1.0 AS similarity,
+                       {cluster_id_sql("images")} AS cluster_id
                 FROM images
                 WHERE image_url IS NOT NULL AND prompt ILIKE %s
                 ORDER BY prompt
                 LIMIT %s;
                 """,
-                (exact_phrase, limit),
+                (exact_phrase, candidate_limit),
             )
             results = cur.fetchall()
             cur.close()
@@ -98,6 +105,13 @@ def search_images(query: str, limit: int = 10) -> SearchResponse:
         if not results:
             return SearchResponse(query=query, results=[])
 
+        # Collapse near-duplicate clusters to their best-clipscore member
+        results = collapse_clusters(
+            results,
+            cluster_of=lambda r: r[4],
+            score_of=lambda r: r[2] if r[2] is not None else 0.0,
+        )[:limit]
+
         image_results = [
             ImageResult(
                 prompt=r[0],
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Offline near-duplicate clustering for the image catalogue.
+
+Stores a `cluster_id` per row so /images, /search and /gambar can collapse
+near-identical images at query time. Re-run after importing new images.
+
+Usage: python cluster_images.py [images|visionimages ...]
+"""
+
+import sys
+
+from app.services.dedup_service import CLUSTERABLE_TABLES, assign_clusters
+from app.utils import logger
+
+if __name__ == "__main__":
+    tables = sys.argv[1:] or list(CLUSTERABLE_TABLES)
+
+    for table in tables:
+        n_clusters = assign_clusters(table)
+        logger.info(f"{table}: {n_clusters} clusters")
@@ -0,0 +1,60 @@
+import numpy as np
+
+from app.services.dedup_service import cluster_embeddings, collapse_clusters
+
+
+def _random_vectors(n, dim=384, seed=1):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_identical_vectors_share_a_cluster():
+    base = _random_vectors(3)
+    vectors = np.vstack([base, base[1]])
+
+    assert cluster_embeddings(vectors).tolist() == [0, 1, 2, 1]
+
+
+def test_near_duplicates_merge_into_lowest_index():
+    rng = np.random.default_rng(2)
+    base = _random_vectors(200)
+    noisy = base[:50] + 0.05 * rng.standard_normal((50, 384)).astype(np.float32)
+    vectors = np.vstack([noisy, base])
+
+    representatives = cluster_embeddings(vectors)
+
+    # Each noisy copy (index i) and its original (index 50 + i) end up with
+    # the copy's index as representative, since it is the lower one
+    assert representatives[:50].tolist() == list(range(50))
+    assert representatives[50:100].tolist() == list(range(50))
+
+
+def test_distant_vectors_stay_separate():
+    vectors = _random_vectors(300)
+
+    assert cluster_embeddings(vectors).tolist() == list(range(300))
+
+
+def test_empty_input():
+    assert cluster_embeddings(np.empty((0, 384))).tolist() == []
+
+
+def test_collapse_keeps_best_score_at_first_position():
+    items = [("a", 1, 0.2), ("b", 2, 0.9), ("c", 1, 0.5), ("d", 1, 0.1)]
+
+    collapsed = collapse_clusters(items, cluster_of=lambda r: r[1], score_of=lambda r: r[2])
+
+    assert collapsed == [("c", 1, 0.5), ("b", 2, 0.9)]
+
+
+def test_collapse_without_score_keeps_first_member():
+    items = [("a", 1), ("b", 1), ("c", 2)]
+
+    assert collapse_clusters(items, cluster_of=lambda r: r[1]) == [("a", 1), ("c", 2)]
+
+
+def test_collapse_keeps_rows_without_cluster():
+    items = [("a", None), ("b", 7), ("c", None), ("d", 7)]
+
+    collapsed = collapse_clusters(items, cluster_of=lambda r: r[1])
+
+    assert collapsed == [("a", None), ("b", 7), ("c", None)]
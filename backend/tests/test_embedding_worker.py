@@ -0,0 +1,182 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services import embedding_worker
+from app.services.embedding_worker import (
+    EmbeddingWorkerError,
+    EmbeddingWorkerPool,
+    EmbeddingWorkerUnavailable,
+)
+
+DIM = 384
+
+
+class StubModel:
+    """Encodes text as its length; a few magic inputs misbehave"""
+
+    def encode(self, text):
+        if text.startswith("sleep:"):
+            time.sleep(float(text[6:]))
+        elif text == "die":
+            os._exit(1)
+        elif text == "bad":
+            raise RuntimeError("boom")
+        return np.full(DIM, float(len(text)), dtype=np.float32)
+
+
+def stub_loader():
+    return StubModel()
+
+
+def slow_loader():
+    time.sleep(1)
+    return StubModel()
+
+
+def failing_loader():
+    raise RuntimeError("no model")
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(workers=1, queue_size=4, timeout=2.0, loader=stub_loader, ready_timeout=60):
+        pool = EmbeddingWorkerPool(workers=workers, queue_size=queue_size, timeout=timeout, dim=DIM, loader=loader)
+        pools.append(pool)
+        pool.start(ready_timeout=ready_timeout)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.stop()
+
+
+def test_round_trip(make_pool):
+    pool = make_pool()
+
+    assert pool.encode("abc") == [3.0] * DIM
+    assert pool._free_slots.qsize() == 4
+
+
+def test_worker_error_is_not_a_fallback(make_pool):
+    pool = make_pool()
+
+    with pytest.raises(EmbeddingWorkerError, match="boom"):
+        pool.encode("bad")
+    assert pool.encode("ok") == [2.0] * DIM
+
+
+def test_timeout_returns_slot_once_worker_finishes(make_pool):
+    pool = make_pool(timeout=0.5)
+
+    with pytest.raises(EmbeddingWorkerError, match="timed out"):
+        pool.encode("sleep:1")
+    assert pool._free_slots.qsize() == 3
+
+    assert wait_for(lambda: pool._free_slots.qsize() == 4)
+
+
+def test_full_queue_waits_for_a_slot(make_pool):
+    pool = make_pool(workers=2, queue_size=2, timeout=5.0)
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(pool.encode, ["x" * i for i in range(1, 9)]))
+
+    assert [r[0] for r in results] == [float(i) for i in range(1, 9)]
+    assert pool._free_slots.qsize() == 2
+
+
+def test_full_queue_fails_after_deadline(make_pool):
+    pool = make_pool(queue_size=1, timeout=0.5)
+
+    with ThreadPoolExecutor(2) as executor:
+        slow = executor.submit(pool.encode, "sleep:1.5")
+        time.sleep(0.1)
+        with pytest.raises(EmbeddingWorkerError, match="queue stayed full"):
+            pool.encode("x")
+        with pytest.raises(EmbeddingWorkerError):
+            slow.result()
+
+
+def test_dead_worker_fails_request_frees_slot_and_respawns(make_pool):
+    pool = make_pool()
+    first = pool._workers[0].process
+
+    with pytest.raises(EmbeddingWorkerError, match="died"):
+        pool.encode("die")
+
+    assert pool._free_slots.qsize() == 4
+    assert wait_for(lambda: pool.is_alive() and pool._workers[0].process is not first)
+    assert pool.encode("abc") == [3.0] * DIM
+
+
+def test_not_ready_is_unavailable(make_pool):
+    pool = make_pool(loader=slow_loader, ready_timeout=0)
+
+    with pytest.raises(EmbeddingWorkerUnavailable):
+        pool.encode("abc")
+    assert wait_for(pool.is_alive)
+    assert pool.encode("abc") == [3.0] * DIM
+
+
+def test_start_returns_early_when_all_workers_exit(make_pool):
+    started = time.monotonic()
+    pool = make_pool(workers=2, loader=failing_loader, ready_timeout=120)
+
+    assert time.monotonic() - started < 60
+    assert not pool.is_alive()
+    with pytest.raises(EmbeddingWorkerUnavailable):
+        pool.encode("abc")
+
+
+def test_stop_fails_in_flight_requests_as_unavailable(make_pool):
+    pool = make_pool(timeout=5.0)
+
+    with ThreadPoolExecutor(1) as executor:
+        in_flight = executor.submit(pool.encode, "sleep:1")
+        time.sleep(0.2)
+        pool.stop()
+        with pytest.raises(EmbeddingWorkerUnavailable):
+            in_flight.result()
+
+    assert pool._shm is None
+    assert not pool._workers
+    with pytest.raises(EmbeddingWorkerUnavailable):
+        pool.encode("abc")
+
+
+def test_partial_start_is_cleaned_up(monkeypatch):
+    created = []
+
+    class FailingPool(EmbeddingWorkerPool):
+        def __init__(self):
+            super().__init__(workers=2, queue_size=4, timeout=2.0, dim=DIM, loader=stub_loader)
+            created.append(self)
+
+        def _spawn(self):
+            if self._workers:
+                raise RuntimeError("spawn failed")
+            return super()._spawn()
+
+    monkeypatch.setattr(embedding_worker, "EMBEDDING_WORKERS", 2)
+    monkeypatch.setattr(embedding_worker, "EmbeddingWorkerPool", FailingPool)
+    embedding_worker.start_workers()
+
+    assert embedding_worker.get_pool() is None
+    pool = created[0]
+    assert pool._shm is None
+    assert not pool._workers